@@ -4,15 +4,20 @@ Stream Display Server - Hauptapplikation
 MQTT-gesteuerter RTSP Stream Display für Raspberry Pi
 """
 
+import atexit
 import json
 import os
+import queue
+import subprocess
 import sys
 import signal
 import threading
+import time
 import logging
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify, send_from_directory, Response
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 
@@ -26,17 +31,23 @@ logger = logging.getLogger('streamdisplay')
 if not logger.handlers:
     logger.setLevel(logging.INFO)
     formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    
+
     # Console Handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-    
+
     # File Handler
     file_handler = logging.FileHandler('/var/log/streamdisplay/server.log')
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-    
+
+    # Log-Aufrufe landen nur in einer Queue; das blockierende Schreiben
+    # (SD-Karte!) erledigt ein Listener-Thread abseits des Request-Pfads
+    _log_queue = queue.Queue(-1)
+    logger.addHandler(QueueHandler(_log_queue))
+    _log_listener = QueueListener(_log_queue, console_handler, file_handler)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
     # Propagate auf False setzen um doppelte Logs zu vermeiden
     logger.propagate = False
 
@@ -56,14 +67,16 @@ unifi_client = None
 BASE_DIR = Path('/opt/streamdisplay')
 CONFIG_FILE = BASE_DIR / 'config.json'
 UPLOAD_FOLDER = BASE_DIR / 'uploads'
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
+ALLOWED_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'gif', 'bmp'})
 
 app.config['UPLOAD_FOLDER'] = str(UPLOAD_FOLDER)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
 
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    # rpartition statt split: keine Zwischenliste, ein Durchlauf
+    _, sep, ext = filename.rpartition('.')
+    return bool(sep) and ext.lower() in ALLOWED_EXTENSIONS
 
 
 def init_components():
@@ -161,19 +174,54 @@ def get_status():
         })
 
 
+# Pfade zu sensiblen Konfigurationswerten - werden in der API maskiert und
+# beim Speichern nur übernommen, wenn sie tatsächlich geändert wurden
+_SECRET_PATHS = (
+    ('mqtt', 'password'),
+    ('unifi_protect', 'password'),
+    ('unifi_protect', 'api_key'),
+)
+
+
+def _mask_secrets(config: dict):
+    """Maskiert alle Secrets in der (kopierten) Konfiguration"""
+    for section, key in _SECRET_PATHS:
+        sub = config.get(section)
+        if isinstance(sub, dict) and key in sub:
+            sub[key] = '***' if sub[key] else ''
+
+
+def _restore_masked_secrets(new_config: dict, current_config: dict):
+    """Ersetzt unveränderte ('***') Secrets durch die aktuellen Werte"""
+    for section, key in _SECRET_PATHS:
+        sub = new_config.get(section)
+        if isinstance(sub, dict) and sub.get(key) == '***':
+            sub[key] = current_config.get(section, {}).get(key, '')
+
+
+# Fertig serialisierte (maskierte) Config-Antwort, gültig solange sich die
+# Konfiguration nicht ändert (Schlüssel: Änderungszähler des ConfigManagers)
+_config_response_cache = (None, None)
+
+
 @app.route('/api/config', methods=['GET'])
 def get_config():
     """Konfiguration abrufen"""
-    config = config_manager.get_all()
-    # Sensible Daten maskieren
-    if 'mqtt' in config and 'password' in config['mqtt']:
-        config['mqtt']['password'] = '***' if config['mqtt']['password'] else ''
-    if 'unifi_protect' in config:
-        if 'password' in config['unifi_protect']:
-            config['unifi_protect']['password'] = '***' if config['unifi_protect']['password'] else ''
-        if 'api_key' in config['unifi_protect']:
-            config['unifi_protect']['api_key'] = '***' if config['unifi_protect']['api_key'] else ''
-    return jsonify(config)
+    global _config_response_cache
+
+    version = config_manager.get_version()
+    cached_version, cached_body = _config_response_cache
+    if cached_body is not None and cached_version == version:
+        return Response(cached_body, mimetype='application/json')
+
+    # Tiefe Kopie über JSON - get_all() kopiert nur flach, Maskieren würde
+    # sonst die Passwörter in der Live-Konfiguration überschreiben
+    config = json.loads(json.dumps(config_manager.get_all()))
+    _mask_secrets(config)
+
+    body = json.dumps(config)
+    _config_response_cache = (version, body)
+    return Response(body, mimetype='application/json')
 
 
 @app.route('/api/config', methods=['POST'])
@@ -183,14 +231,8 @@ def update_config():
         new_config = request.json
         
         # Sensible Daten nur aktualisieren wenn geändert
-        current_config = config_manager.get_all()
-        if new_config.get('mqtt', {}).get('password') == '***':
-            new_config['mqtt']['password'] = current_config.get('mqtt', {}).get('password', '')
-        if new_config.get('unifi_protect', {}).get('password') == '***':
-            new_config['unifi_protect']['password'] = current_config.get('unifi_protect', {}).get('password', '')
-        if new_config.get('unifi_protect', {}).get('api_key') == '***':
-            new_config['unifi_protect']['api_key'] = current_config.get('unifi_protect', {}).get('api_key', '')
-        
+        _restore_masked_secrets(new_config, config_manager.get_all())
+
         config_manager.update(new_config)
         config_manager.save()
         
@@ -282,16 +324,13 @@ def play_stream():
         stream_id = data.get('stream_id')
         
         if stream_id:
-            # Stream anhand der ID finden
-            streams = config_manager.get('streams.custom_streams', [])
-            stream = next((s for s in streams if s.get('id') == stream_id), None)
+            # Stream anhand der ID finden (indizierter Lookup)
+            stream = config_manager.get_stream_by_id(stream_id)
             if stream:
                 url = stream.get('url')
             elif unifi_client:
-                cameras = unifi_client.get_cameras()
-                camera = next((c for c in cameras if c['id'] == stream_id), None)
-                if camera:
-                    url = camera['rtsp_url']
+                # Löst den RTSPS-Stream beim ersten Zugriff auf (lazy)
+                url = unifi_client.get_rtsp_url(stream_id)
         
         if not url:
             return jsonify({'success': False, 'error': 'Keine Stream-URL angegeben'}), 400
@@ -331,8 +370,19 @@ def upload_fallback():
             filename = 'fallback' + os.path.splitext(file.filename)[1]
             filepath = UPLOAD_FOLDER / filename
             UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
-            file.save(str(filepath))
-            
+
+            # In Blöcken in eine Temp-Datei streamen statt die ganze Datei
+            # im Speicher zu puffern, dann atomar umbenennen - so liegt nie
+            # eine halb geschriebene Datei unter dem finalen Pfad
+            tmp_path = filepath.with_suffix(filepath.suffix + '.tmp')
+            with open(tmp_path, 'wb') as out:
+                while True:
+                    chunk = file.stream.read(65536)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+            os.replace(tmp_path, filepath)
+
             config_manager.set('streams.fallback_image', str(filepath))
             config_manager.save()
             
@@ -365,7 +415,6 @@ def get_unifi_snapshot(camera_id):
     try:
         snapshot = unifi_client.get_camera_snapshot(camera_id)
         if snapshot:
-            from flask import Response
             return Response(snapshot, mimetype='image/jpeg')
         else:
             # Fallback: transparentes Placeholder-Bild
@@ -396,6 +445,11 @@ def test_unifi_connection():
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
     """Hochgeladene Dateien bereitstellen"""
+    # Hinter nginx kann die Auslieferung per X-Accel-Redirect an den Proxy
+    # delegiert werden (sendfile im Kernel statt Byte-Kopien durch Python).
+    # Benötigt eine interne nginx-Location für /uploads/
+    if config_manager and config_manager.get('webui.use_x_accel', False):
+        return Response(headers={'X-Accel-Redirect': f'/uploads/{secure_filename(filename)}'})
     return send_from_directory(str(UPLOAD_FOLDER), filename)
 
 
@@ -403,33 +457,64 @@ def uploaded_file(filename):
 def restart_service():
     """Service neu starten"""
     try:
-        os.system('sudo systemctl restart streamdisplay')
+        # Popen statt os.system: kein Shell-Fork, und der Request-Thread
+        # wartet nicht auf systemctl (das diesen Prozess selbst beendet)
+        subprocess.Popen(['sudo', 'systemctl', 'restart', 'streamdisplay'])
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# Systeminfo-Cache: (Zeitstempel, Daten) - 2 Sekunden sind für die
+# UI-Anzeige mehr als frisch genug
+_SYSTEM_INFO_TTL = 2.0
+_system_info_cache = (0.0, None)
+
+
+def _read_cpu_temp() -> str:
+    """Liest die CPU-Temperatur direkt aus sysfs (kein vcgencmd-Fork)"""
+    with open('/sys/class/thermal/thermal_zone0/temp') as f:
+        return f"{int(f.read().strip()) / 1000:.1f}°C"
+
+
+def _read_uptime() -> str:
+    """Liest die Uptime aus /proc und formatiert sie lesbar"""
+    with open('/proc/uptime') as f:
+        seconds = int(float(f.read().split()[0]))
+
+    days, rest = divmod(seconds, 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes = rest // 60
+
+    parts = []
+    if days:
+        parts.append(f"{days} Tage" if days != 1 else "1 Tag")
+    if hours:
+        parts.append(f"{hours} Stunden" if hours != 1 else "1 Stunde")
+    parts.append(f"{minutes} Minuten" if minutes != 1 else "1 Minute")
+    return "up " + ", ".join(parts)
+
+
 @app.route('/api/system/info')
 def system_info():
     """Systeminformationen"""
-    import subprocess
-    
+    global _system_info_cache
+
     try:
-        # CPU Temperatur
-        temp = subprocess.check_output(['vcgencmd', 'measure_temp']).decode().strip()
-        temp = temp.replace("temp=", "").replace("'C", "°C")
-        
-        # Memory
-        mem = subprocess.check_output(['free', '-h']).decode()
-        
-        # Uptime
-        uptime = subprocess.check_output(['uptime', '-p']).decode().strip()
-        
-        return jsonify({
-            'temperature': temp,
-            'uptime': uptime,
+        # Kurzer Memo-Cache: die UI pollt diesen Endpoint, und pro Request
+        # drei Prozesse zu forken ist auf dem Pi der dominante Kostenfaktor
+        cached_at, cached = _system_info_cache
+        if cached and time.monotonic() - cached_at < _SYSTEM_INFO_TTL:
+            return jsonify(cached)
+
+        info = {
+            'temperature': _read_cpu_temp(),
+            'uptime': _read_uptime(),
             'hostname': os.uname().nodename
-        })
+        }
+        _system_info_cache = (time.monotonic(), info)
+
+        return jsonify(info)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -454,8 +539,11 @@ def main():
     # Webserver starten
     from waitress import serve
     port = config_manager.get('webui.port', 80)
-    logger.info(f"Starte Webserver auf Port {port}")
-    serve(app, host='0.0.0.0', port=port, threads=4)
+    # Die Endpoints sind I/O-lastig (UniFi Controller, MQTT Broker) - mehr
+    # Threads erlauben parallele Snapshot-/Status-Anfragen ohne Blockierung
+    threads = config_manager.get('webui.threads', 16)
+    logger.info(f"Starte Webserver auf Port {port} ({threads} Threads)")
+    serve(app, host='0.0.0.0', port=port, threads=threads)
 
 
 if __name__ == '__main__':
@@ -52,6 +52,7 @@ apt-get install -y -qq \
     python3-venv \
     mpv \
     feh \
+    ffmpeg \
     mosquitto \
     mosquitto-clients \
     git \
@@ -13,14 +13,51 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+# Sentinel für Cache-Einträge zu nicht vorhandenen Schlüsseln
+_MISSING = object()
+
+# Die bekannten Top-Level-Sektionen sind nur eine Ebene tief - für sie
+# genügt ein einzelnes dict.update statt des rekursiven Deep-Updates
+_FLAT_SECTIONS = frozenset(('mqtt', 'unifi_protect', 'streams', 'player', 'webui'))
+
+
 class ConfigManager:
     """Verwaltet die Konfiguration des Stream Display Servers"""
-    
+
     def __init__(self, config_path: str):
         self.config_path = Path(config_path)
         self.config = {}
         self._lock = threading.Lock()
+        # Lookup-Cache für get() - wird bei jeder Änderung invalidiert.
+        # _version zählt Änderungen mit, damit Aufrufer eigene abgeleitete
+        # Caches ebenfalls invalidieren können
+        self._version = 0
+        self._get_cache = {}
+        # Index id -> Stream über streams.custom_streams, damit Lookups
+        # nicht pro Request/Nachricht linear über die Liste laufen müssen
+        self._stream_index = {}
+        # Zuletzt geschriebener Stand - unveränderte Saves werden übersprungen
+        # (schont die SD-Karte, der dominante I/O-Engpass auf dem Pi)
+        self._last_saved: Optional[str] = None
         self._load()
+
+    def _invalidate(self):
+        """Invalidiert den Lookup-Cache nach einer Änderung"""
+        self._version += 1
+        self._get_cache = {}
+        self._rebuild_stream_index()
+
+    def _rebuild_stream_index(self):
+        """Baut den id->Stream Index über die Custom Streams neu auf"""
+        streams = self.config.get('streams', {}).get('custom_streams', [])
+        self._stream_index = {
+            s['id']: s for s in streams
+            if isinstance(s, dict) and s.get('id')
+        }
+
+    def get_stream_by_id(self, stream_id: str) -> Optional[dict]:
+        """Findet einen Custom Stream anhand seiner ID (O(1))"""
+        return self._stream_index.get(stream_id)
     
     def _load(self):
         """Lädt die Konfiguration aus der Datei"""
@@ -34,6 +71,7 @@ class ConfigManager:
         except Exception as e:
             logger.error(f"Fehler beim Laden der Konfiguration: {e}")
             self._create_default()
+        self._invalidate()
     
     def _create_default(self):
         """Erstellt eine Standard-Konfiguration"""
@@ -66,6 +104,8 @@ class ConfigManager:
             },
             "webui": {
                 "port": 80,
+                "threads": 16,
+                "use_x_accel": False,
                 "auth_enabled": False,
                 "username": "admin",
                 "password": "admin"
@@ -74,12 +114,26 @@ class ConfigManager:
         self.save()
     
     def save(self):
-        """Speichert die Konfiguration in die Datei"""
+        """Speichert die Konfiguration atomar in die Datei"""
         with self._lock:
             try:
+                data = json.dumps(self.config, indent=4, ensure_ascii=False)
+                if data == self._last_saved:
+                    logger.debug("Konfiguration unverändert, Speichern übersprungen")
+                    return
+
                 self.config_path.parent.mkdir(parents=True, exist_ok=True)
-                with open(self.config_path, 'w', encoding='utf-8') as f:
-                    json.dump(self.config, f, indent=4, ensure_ascii=False)
+
+                # Erst in Temp-Datei schreiben, dann atomar tauschen - eine
+                # halb geschriebene config.json kann so nicht mehr entstehen
+                tmp_path = self.config_path.with_suffix('.tmp')
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.config_path)
+
+                self._last_saved = data
                 logger.info("Konfiguration gespeichert")
             except Exception as e:
                 logger.error(f"Fehler beim Speichern der Konfiguration: {e}")
@@ -89,12 +143,19 @@ class ConfigManager:
         Holt einen Konfigurationswert (mit Punkt-Notation für verschachtelte Werte)
         z.B. get('mqtt.broker')
         """
+        # Heiße Schlüssel werden pro Nachricht/Request wiederholt abgefragt -
+        # Treffer aus dem Cache ersparen split() und den Dict-Walk
+        cached = self._get_cache.get(key, _MISSING)
+        if cached is not _MISSING:
+            return cached
+
         keys = key.split('.')
         value = self.config
-        
+
         try:
             for k in keys:
                 value = value[k]
+            self._get_cache[key] = value
             return value
         except (KeyError, TypeError):
             return default
@@ -114,7 +175,15 @@ class ConfigManager:
                 config = config[k]
             
             config[keys[-1]] = value
-    
+            self._invalidate()
+
+    def get_version(self) -> int:
+        """
+        Gibt den Änderungszähler zurück - eignet sich als Cache-Schlüssel
+        für von der Konfiguration abgeleitete Daten
+        """
+        return self._version
+
     def get_all(self) -> dict:
         """Gibt die gesamte Konfiguration zurück"""
         return self.config.copy()
@@ -122,7 +191,18 @@ class ConfigManager:
     def update(self, new_config: dict):
         """Aktualisiert die Konfiguration mit einem neuen Dictionary"""
         with self._lock:
-            self._deep_update(self.config, new_config)
+            for key, value in new_config.items():
+                base_value = self.config.get(key)
+                if (key in _FLAT_SECTIONS and isinstance(value, dict)
+                        and isinstance(base_value, dict)):
+                    # Bekannte flache Sektion: ein direktes dict.update
+                    base_value.update(value)
+                elif isinstance(value, dict) and isinstance(base_value, dict):
+                    # Unbekannte/verschachtelte Sektion: generischer Walk
+                    self._deep_update(base_value, value)
+                else:
+                    self.config[key] = value
+            self._invalidate()
     
     def _deep_update(self, base: dict, updates: dict):
         """Rekursives Update eines Dictionaries"""
@@ -4,6 +4,9 @@ MQTT Client - MQTT Kommunikation für Stream Display Server
 """
 
 import json
+import queue
+import socket
+import subprocess
 import threading
 import time
 import logging
@@ -11,8 +14,28 @@ from typing import Callable, Optional
 
 import paho.mqtt.client as mqtt
 
+# orjson serialisiert mehrfach schneller als das stdlib-json und liefert
+# direkt bytes (paho akzeptiert die ohne encode-Schritt) - Fallback auf
+# stdlib json wenn orjson nicht installiert ist
+try:
+    import orjson
+
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+
+    _loads = json.loads
+
 logger = logging.getLogger(__name__)
 
+# Last-Will Payload ist konstant - einmal serialisieren statt bei jedem
+# Verbindungsaufbau während eines Broker-Ausfalls
+_WILL_PAYLOAD = _dumps({'status': 'offline'})
+
 
 class MQTTClient:
     """MQTT Client für Stream Display Server"""
@@ -25,8 +48,37 @@ class MQTTClient:
         self._running = False
         self._thread = None
         self._unifi_client = None
-        self._reconnect_count = 0
         self._max_reconnect_delay = 60  # Max 60 Sekunden zwischen Reconnects
+        # Client-ID des bestehenden Clients - nur bei Änderung wird ein
+        # neues mqtt.Client-Objekt angelegt
+        self._client_id = None
+        # Vorberechnete Topic-Basis, Topics und Topic->Handler Tabelle
+        # (siehe _rebuild_topics) - erspart config.get und f-String-Aufbau
+        # pro Nachricht
+        self._topic_base = None
+        self._topics = {}
+        self._dispatch = {}
+        # Letzter veröffentlichter Kamera-Stand - verhindert Retained-Message-
+        # Stürme wenn publish_cameras ohne Änderung erneut aufgerufen wird
+        self._last_cameras_hash = None
+        # Letzter veröffentlichter Player-Zustand - identische Folge-Status
+        # werden nicht erneut publiziert (Topics sind retained)
+        self._last_state = None
+        # Entprellung: schnelle publish_status-Folgen (Switch + Reconnect)
+        # werden zu einer Veröffentlichung zusammengefasst
+        self._status_debounce: Optional[threading.Timer] = None
+        self._status_debounce_lock = threading.Lock()
+        # Worker-Queue: Handler (insb. der ~sekundenlange Stream-Wechsel)
+        # laufen nicht im paho Netzwerk-Thread, der sonst Pings und weitere
+        # Nachrichten blockieren würde
+        self._work_queue = queue.SimpleQueue()
+        self._worker_thread: Optional[threading.Thread] = None
+        # Befehlstabelle für das command-Topic
+        self._commands = {
+            'status': self.publish_status,
+            'cameras': self.publish_cameras,
+            'restart': self._cmd_restart,
+        }
     
     def set_unifi_client(self, unifi_client):
         """Setzt die UniFi Protect Client Referenz"""
@@ -37,65 +89,128 @@ class MQTTClient:
         """Generiert die Topic-Basis mit optionaler Device-ID"""
         prefix = self.config.get('mqtt.topic_prefix', 'streamdisplay')
         device_id = self.config.get('mqtt.device_id', '')
-        
+
         if device_id:
             return f"{prefix}/{device_id}"
         return prefix
-        
+
+    def _rebuild_topics(self):
+        """
+        Baut die Topic-Tabelle und das Topic->Handler Dispatch neu auf.
+        Wird bei Connect und nach einem Konfigurations-Reload aufgerufen
+        """
+        topic_base = self._get_topic_base()
+        self._topic_base = topic_base
+
+        self._topics = {
+            'switch': f"{topic_base}/switch",
+            'stop': f"{topic_base}/stop",
+            'reload': f"{topic_base}/reload",
+            'command': f"{topic_base}/command",
+            'status': f"{topic_base}/status",
+            'current': f"{topic_base}/current",
+            'cameras': f"{topic_base}/cameras",
+        }
+        self._dispatch = {
+            self._topics['switch']: self._handle_switch,
+            self._topics['stop']: self._handle_stop,
+            self._topics['reload']: self._handle_reload,
+            self._topics['command']: self._handle_command,
+        }
+
+        # Topic-Basis kann sich geändert haben - Kameras neu veröffentlichen
+        self._last_cameras_hash = None
+
     def start(self):
         """Startet den MQTT Client"""
         self._running = True
+        self._worker_thread = threading.Thread(target=self._worker_loop, daemon=True)
+        self._worker_thread.start()
         self._connect()
-        
+
+    def _worker_loop(self):
+        """Arbeitet eingehende Nachrichten außerhalb des paho-Threads ab"""
+        while True:
+            item = self._work_queue.get()
+            if item is None:
+                break
+
+            handler, payload = item
+            try:
+                handler(payload)
+            except Exception as e:
+                logger.error(f"Fehler bei MQTT Nachrichtenverarbeitung: {e}")
+
     def stop(self):
         """Stoppt den MQTT Client"""
         self._running = False
+        with self._status_debounce_lock:
+            if self._status_debounce:
+                self._status_debounce.cancel()
+                self._status_debounce = None
         if self.client:
             self.client.loop_stop()
             self.client.disconnect()
+        if self._worker_thread:
+            self._work_queue.put(None)  # Sentinel beendet den Worker
+            self._worker_thread.join(timeout=2)
+            self._worker_thread = None
         logger.info("MQTT Client gestoppt")
     
     def _connect(self):
         """Stellt Verbindung zum MQTT Broker her"""
-        # Alten Client sauber beenden
-        if self.client:
-            try:
-                self.client.loop_stop()
-                self.client.disconnect()
-            except:
-                pass
-            self.client = None
-        
         try:
             broker = self.config.get('mqtt.broker', 'localhost')
             port = self.config.get('mqtt.port', 1883)
             username = self.config.get('mqtt.username', '')
             password = self.config.get('mqtt.password', '')
             client_id = self.config.get('mqtt.client_id', 'streamdisplay-server')
-            
+
             logger.info(f"Verbinde zu MQTT Broker: {broker}:{port}")
-            
-            self.client = mqtt.Client(client_id=client_id, protocol=mqtt.MQTTv311)
-            
+
+            # Client-Objekt wiederverwenden - Neuanlage nur wenn es noch
+            # keines gibt oder sich die Client-ID geändert hat
+            if self.client is None or client_id != self._client_id:
+                if self.client:
+                    try:
+                        self.client.loop_stop()
+                        self.client.disconnect()
+                    except:
+                        pass
+
+                self.client = mqtt.Client(client_id=client_id, protocol=mqtt.MQTTv311)
+                self._client_id = client_id
+
+                # Reconnect mit exponentiellem Backoff übernimmt paho selbst -
+                # das blockiert keinen Callback-Thread
+                self.client.reconnect_delay_set(min_delay=5, max_delay=self._max_reconnect_delay)
+
+                # Callbacks
+                self.client.on_connect = self._on_connect
+                self.client.on_disconnect = self._on_disconnect
+                self.client.on_message = self._on_message
+            else:
+                # Nur die Verbindung neu aufbauen
+                try:
+                    self.client.loop_stop()
+                    self.client.disconnect()
+                except:
+                    pass
+
             if username:
                 self.client.username_pw_set(username, password)
-            
-            # Callbacks
-            self.client.on_connect = self._on_connect
-            self.client.on_disconnect = self._on_disconnect
-            self.client.on_message = self._on_message
-            
+
             # Last Will mit Device-ID Support
             topic_base = self._get_topic_base()
             self.client.will_set(
                 f"{topic_base}/status",
-                json.dumps({'status': 'offline'}),
+                _WILL_PAYLOAD,
                 qos=1,
                 retain=True
             )
             
             logger.info(f"MQTT Topic-Basis: {topic_base}")
-            
+
             self.client.connect_async(broker, port, keepalive=60)
             self.client.loop_start()
             
@@ -105,30 +220,37 @@ class MQTTClient:
     
     def reconnect(self):
         """Verbindung neu aufbauen"""
-        if self.client:
-            self.client.loop_stop()
-            self.client.disconnect()
+        # _connect trennt eine bestehende Verbindung selbst und
+        # verwendet das Client-Objekt weiter
         self._connect()
     
     def _on_connect(self, client, userdata, flags, rc):
         """Callback bei erfolgreicher Verbindung"""
         if rc == 0:
             self._connected = True
-            self._reconnect_count = 0  # Reset bei erfolgreicher Verbindung
             logger.info("MQTT verbunden")
+
+            # Nagle deaktivieren: kleine Status-PUBLISHes sollen sofort raus
+            # statt bis zu 40 ms gepuffert zu werden; TCP-Keepalive erkennt
+            # tote Broker früher als der 60s MQTT-Keepalive
+            try:
+                sock = client.socket()
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            except Exception as e:
+                logger.debug(f"Socket-Optionen nicht gesetzt: {e}")
             
-            topic_base = self._get_topic_base()
-            
-            # Topics abonnieren
-            topics = [
-                (f"{topic_base}/switch", 0),
-                (f"{topic_base}/stop", 0),
-                (f"{topic_base}/reload", 0),
-                (f"{topic_base}/command", 0),
-            ]
-            
-            for topic, qos in topics:
-                client.subscribe(topic, qos)
+            # Nach jedem (Re-)Connect frisch publizieren - auch nach paho-
+            # internen Reconnects, bei denen der Broker gerade das retained
+            # Last-Will 'offline' veröffentlicht hat. Ohne Reset würde die
+            # Status-Deduplizierung den Korrektur-Publish verschlucken
+            self._last_state = None
+
+            # Topics einmalig aufbauen und Handler-Tabelle füllen
+            self._rebuild_topics()
+
+            for topic in self._dispatch:
+                client.subscribe(topic, 0)
                 logger.info(f"Abonniert: {topic}")
             
             # Status veröffentlichen
@@ -143,47 +265,41 @@ class MQTTClient:
         """Callback bei Verbindungsabbruch"""
         self._connected = False
         logger.warning(f"MQTT Verbindung getrennt: {rc}")
-        
-        # Automatischer Reconnect mit exponential backoff
-        if self._running:
-            self._reconnect_count += 1
-            # Exponential backoff: 5, 10, 20, 40, 60, 60, 60...
-            delay = min(5 * (2 ** (self._reconnect_count - 1)), self._max_reconnect_delay)
-            logger.info(f"MQTT Reconnect in {delay} Sekunden (Versuch {self._reconnect_count})")
-            time.sleep(delay)
-            if self._running:  # Nochmal prüfen nach dem Sleep
-                self._connect()
+        # Den Reconnect übernimmt paho im Netzwerk-Thread (siehe
+        # reconnect_delay_set in _connect) - hier nichts blockieren
     
     def _on_message(self, client, userdata, msg):
         """Callback bei eingehender Nachricht"""
         try:
-            topic_base = self._get_topic_base()
-            topic = msg.topic
-            payload = msg.payload.decode('utf-8') if msg.payload else ''
-            
-            logger.info(f"MQTT Nachricht empfangen: {topic} = {payload}")
-            
-            if topic == f"{topic_base}/switch":
-                self._handle_switch(payload)
-            elif topic == f"{topic_base}/stop":
-                self._handle_stop()
-            elif topic == f"{topic_base}/reload":
-                self._handle_reload()
-            elif topic == f"{topic_base}/command":
-                self._handle_command(payload)
-                
+            # Payload als bytes durchreichen - orjson/json parsen bytes
+            # direkt, das spart den decode-Zwischenschritt pro Nachricht
+            payload = msg.payload or b''
+
+            logger.info(f"MQTT Nachricht empfangen: {msg.topic} = {payload!r}")
+
+            # Ein Dict-Lookup statt vier f-String-Vergleichen pro Nachricht;
+            # die eigentliche Arbeit übernimmt der Worker-Thread
+            handler = self._dispatch.get(msg.topic)
+            if handler:
+                self._work_queue.put((handler, payload))
+
         except Exception as e:
             logger.error(f"Fehler bei MQTT Nachrichtenverarbeitung: {e}")
     
-    def _handle_switch(self, payload: str):
+    def _handle_switch(self, payload: bytes):
         """Verarbeitet Stream-Wechsel Befehl"""
         try:
-            data = json.loads(payload) if payload.startswith('{') else {'url': payload}
-            
-            url = data.get('url')
-            camera_id = data.get('camera_id')
-            stream_id = data.get('stream_id')
-            
+            if payload[:1] != b'{':
+                # Häufigster Fall aus Automationen: nackte URL als Payload -
+                # weder JSON-Parse noch Hilfs-Dict nötig
+                url = payload.decode('utf-8')
+                camera_id = stream_id = None
+            else:
+                data = _loads(payload)
+                url = data.get('url')
+                camera_id = data.get('camera_id')
+                stream_id = data.get('stream_id')
+
             if camera_id:
                 # UniFi Kamera - URL vom UniFi Client abrufen
                 if self._unifi_client:
@@ -197,9 +313,8 @@ class MQTTClient:
                     logger.error("UniFi Protect Client nicht verfügbar")
                     return
             elif stream_id:
-                # Custom Stream
-                streams = self.config.get('streams.custom_streams', [])
-                stream = next((s for s in streams if s.get('id') == stream_id), None)
+                # Custom Stream - über den Index des ConfigManagers (O(1))
+                stream = self.config.get_stream_by_id(stream_id)
                 if stream:
                     url = stream.get('url')
             
@@ -213,73 +328,102 @@ class MQTTClient:
         except Exception as e:
             logger.error(f"Fehler beim Stream-Wechsel: {e}")
     
-    def _handle_stop(self):
+    def _handle_stop(self, payload: bytes = b''):
         """Verarbeitet Stop-Befehl"""
         logger.info("Stoppe Stream")
         self.player.stop()
         self.publish_status()
     
-    def _handle_reload(self):
+    def _handle_reload(self, payload: bytes = b''):
         """Verarbeitet Reload-Befehl"""
         logger.info("Lade Konfiguration neu")
         self.config.reload()
+        # Topic-Prefix/Device-ID können sich geändert haben
+        self._rebuild_topics()
         self.publish_status()
         self.publish_cameras()
     
-    def _handle_command(self, payload: str):
+    def _handle_command(self, payload: bytes):
         """Verarbeitet allgemeine Befehle"""
         try:
-            data = json.loads(payload)
-            command = data.get('command')
-            
-            if command == 'status':
-                self.publish_status()
-            elif command == 'cameras':
-                self.publish_cameras()
-            elif command == 'restart':
-                import os
-                os.system('sudo systemctl restart streamdisplay')
-                
+            command = _loads(payload).get('command')
+            handler = self._commands.get(command)
+            if handler:
+                handler()
         except Exception as e:
             logger.error(f"Fehler bei Befehlsverarbeitung: {e}")
+
+    def _cmd_restart(self):
+        """Startet den Service neu (ohne den MQTT-Thread zu blockieren)"""
+        subprocess.Popen(['sudo', 'systemctl', 'restart', 'streamdisplay'])
     
-    def publish(self, topic_suffix: str, payload: dict, retain: bool = False):
-        """Veröffentlicht eine Nachricht"""
+    def publish(self, topic_suffix: str, payload: dict, retain: bool = False, qos: int = 0):
+        """
+        Veröffentlicht eine Nachricht.
+        QoS 0 ist der Standard: bei retained Zustandsmeldungen zählt nur der
+        letzte Wert, der PUBACK-Roundtrip von QoS 1 bringt nichts. QoS 1 nur
+        explizit anfordern, wo Zustellung wirklich garantiert sein muss
+        """
         if not self._connected or not self.client:
             return
-        
-        topic_base = self._get_topic_base()
-        topic = f"{topic_base}/{topic_suffix}"
-        
+
+        # Gebundene Topic-Basis aus _rebuild_topics - keine zwei
+        # config.get-Lookups pro Veröffentlichung
+        topic = f"{self._topic_base}/{topic_suffix}"
+
         try:
+            # Bereits serialisierte Payloads (bytes) unverändert durchreichen -
+            # Aufrufer wie der UniFi Client serialisieren selbst genau einmal
+            data = payload if isinstance(payload, bytes) else _dumps(payload)
             self.client.publish(
                 topic,
-                json.dumps(payload),
-                qos=1,
+                data,
+                qos=qos,
                 retain=retain
             )
         except Exception as e:
             logger.error(f"Fehler beim Veröffentlichen: {e}")
-    
+
     def publish_status(self):
-        """Veröffentlicht den aktuellen Status"""
-        status = {
-            'status': self.player.get_status(),
-            'current_stream': self.player.get_current_stream(),
+        """Veröffentlicht den aktuellen Status (entprellt)"""
+        with self._status_debounce_lock:
+            if self._status_debounce:
+                self._status_debounce.cancel()
+            self._status_debounce = threading.Timer(0.1, self._publish_status_now)
+            self._status_debounce.daemon = True
+            self._status_debounce.start()
+
+    def _publish_status_now(self):
+        """Veröffentlicht den aktuellen Status sofort"""
+        player_status = self.player.get_status()
+        current_stream = self.player.get_current_stream()
+
+        # Unveränderter Zustand? Retained Topics müssen nicht neu
+        # geschrieben werden - spart Broker-Roundtrips bei schnellen Switches
+        state = (player_status, current_stream)
+        if state == self._last_state:
+            return
+        self._last_state = state
+
+        self.publish('status', {
+            'status': player_status,
+            'current_stream': current_stream,
             'timestamp': time.time()
-        }
-        self.publish('status', status, retain=True)
-        
+        }, retain=True)
+
         # Aktuellen Stream separat veröffentlichen
         self.publish('current', {
-            'url': self.player.get_current_stream(),
-            'status': self.player.get_status()
+            'url': current_stream,
+            'status': player_status
         }, retain=True)
     
     def publish_cameras(self):
         """Veröffentlicht die verfügbaren Kameras/Streams"""
+        if not self._connected or not self.client:
+            return
+
         cameras = []
-        
+
         # Custom Streams
         custom_streams = self.config.get('streams.custom_streams', [])
         for stream in custom_streams:
@@ -288,8 +432,24 @@ class MQTTClient:
                 'name': stream.get('name', ''),
                 'type': 'custom'
             })
-        
-        self.publish('cameras', {'cameras': cameras}, retain=True)
+
+        # Unverändert? Dann nicht erneut veröffentlichen (retained Topic)
+        cameras_hash = hash(tuple((c['id'], c['name']) for c in cameras))
+        if cameras_hash == self._last_cameras_hash:
+            return
+        self._last_cameras_hash = cameras_hash
+
+        # Direkt auf dem vorberechneten Topic veröffentlichen - spart den
+        # Topic-Aufbau im generischen publish()-Wrapper
+        try:
+            self.client.publish(
+                self._topics['cameras'],
+                _dumps({'cameras': cameras}),
+                qos=1,
+                retain=True
+            )
+        except Exception as e:
+            logger.error(f"Fehler beim Veröffentlichen: {e}")
     
     def is_connected(self) -> bool:
         """Prüft ob MQTT verbunden ist"""
@@ -5,6 +5,8 @@ Optimiert für niedrige Latenz auf Raspberry Pi 4
 """
 
 import os
+import select
+import socket
 import subprocess
 import threading
 import time
@@ -16,21 +18,63 @@ from pathlib import Path
 logger = logging.getLogger(__name__)
 
 
+# Codec-spezifische Hardware-Decoder-Profile für den Pi 4: H.264 läuft über
+# den BCM2835-Block (V4L2 M2M), HEVC über den Stateless-Decoder (DRM PRIME)
+_CODEC_HWDEC = {
+    'h264': ('--hwdec=v4l2m2m-copy',),
+    'hevc': ('--hwdec=drm',),
+}
+_DEFAULT_HWDEC = ('--hwdec=v4l2m2m-copy',)
+
+
 class StreamPlayer:
     """RTSP Stream Player mit mpv und Hardware-Beschleunigung"""
     
     def __init__(self, config_manager):
         self.config = config_manager
         self._process: Optional[subprocess.Popen] = None
+        # Vom Spawn-/Monitor-Pfad gepflegtes Lebenszeichen des mpv-Prozesses -
+        # Status-Getter lesen das Flag statt pro Aufruf poll() (waitpid)
+        # auszuführen. Attributzuweisung ist unter dem GIL atomar
+        self._process_alive = False
         self._current_stream: Optional[str] = None
         self._status = 'stopped'
         self._lock = threading.Lock()
         self._monitor_thread: Optional[threading.Thread] = None
         self._running = True
+        # Weckt den Monitor-Thread sofort aus Reconnect-Wartezeiten
+        self._monitor_stop = threading.Event()
         
         # Fallback Image Prozess
         self._fallback_process: Optional[subprocess.Popen] = None
-        
+
+        # Umgebung für Kindprozesse einmal kopieren - sie ändert sich zur
+        # Laufzeit nicht, und Popen mutiert das übergebene dict nicht
+        env = os.environ.copy()
+        env.setdefault('DISPLAY', ':0')
+        self._child_env = env
+
+        # Statische mpv-Argumente einmal aufbauen - der Reconnect-Pfad kann
+        # in schneller Folge starten und soll nicht jedes Mal Config-Lookups
+        # und den Listenaufbau wiederholen. Der Versionszähler des
+        # ConfigManagers invalidiert das Tupel nach Konfigurationsänderungen
+        self._mpv_static_args = tuple(self._build_mpv_args())
+        self._mpv_args_version = self.config.get_version()
+
+        # IPC-Socket pro mpv-Start - eindeutiger Pfad, damit sich alter und
+        # neuer Prozess beim nahtlosen Übergang nicht in die Quere kommen
+        self._ipc_seq = 0
+        self._ipc_socket: Optional[str] = None
+
+        # Erfolgreiche Codec-Proben pro URL - Fehlschläge werden nicht
+        # gecacht, damit ein transienter Timeout nicht bis zum Neustart
+        # den falschen Decoder festnagelt
+        self._codec_cache = {}
+
+        # Gecachter stat()-Befund zum Fallback-Bild (Pfad, vorhanden) -
+        # neu geprüft wird nur wenn sich der konfigurierte Pfad ändert
+        self._fallback_stat = (None, False)
+
     def play(self, url: str):
         """Startet einen neuen Stream (mit nahtlosem Übergang)"""
         with self._lock:
@@ -44,11 +88,10 @@ class StreamPlayer:
                 self._start_mpv(url)
                 self._current_stream = url
                 self._status = 'starting'
-                
-                # Kurz warten und prüfen ob mpv noch läuft
-                time.sleep(1.0)
-                
-                if self._process and self._process.poll() is None:
+
+                # Auf IPC-Bereitschaft warten statt fix zu schlafen - der
+                # alte Prozess kann so meist schon nach ~100 ms weg
+                if self._wait_for_startup(1.0):
                     # mpv läuft tatsächlich
                     self._status = 'playing'
                     logger.info("Stream läuft erfolgreich")
@@ -66,12 +109,14 @@ class StreamPlayer:
                     # mpv ist sofort abgestürzt
                     exit_code = self._process.returncode if self._process else -1
                     logger.error(f"mpv sofort beendet mit Code {exit_code}")
+                    self._process_alive = False
                     self._status = 'error'
                     self._current_stream = url  # Behalte URL für Anzeige
                     self._show_fallback()
-                
+
             except Exception as e:
                 logger.error(f"Fehler beim Starten des Streams: {e}")
+                self._process_alive = False
                 self._status = 'error'
                 self._show_fallback()
     
@@ -79,28 +124,28 @@ class StreamPlayer:
         """Stoppt den aktuellen Stream"""
         with self._lock:
             logger.info("Stoppe Stream")
-            self._stop_monitor()
-            
+            # Erst den Prozess beenden - das weckt den blockierenden wait()
+            # im Monitor-Thread, der dann sauber per join eingesammelt wird
+            self._running = False
             if self._process:
                 self._terminate_process(self._process)
                 self._process = None
-            
+            self._process_alive = False
+            self._stop_monitor()
+
             self._current_stream = None
             self._status = 'stopped'
             
             # Fallback anzeigen
             self._show_fallback()
     
-    def _start_mpv(self, url: str):
-        """Startet mpv mit optimierten Einstellungen für niedrige Latenz"""
+    def _build_mpv_args(self) -> list:
+        """Erstellt die statischen mpv-Argumente (ohne URL) aus der Konfiguration"""
         hw_accel = self.config.get('player.hardware_acceleration', True)
-        buffer_time = self.config.get('player.buffer_time_ms', 500)
-        
+
         # mpv Argumente für minimale Latenz bei Live-RTSP-Streams
         # WICHTIG: --no-audio verhindert A-V Desync bei Hardware-Dekodierung
         args = [
-            'mpv',
-            url,
             '--fullscreen',
             '--no-border',
             '--no-osc',
@@ -108,7 +153,6 @@ class StreamPlayer:
             '--really-quiet',
             '--no-terminal',
             '--no-input-terminal',        # Keine Terminal-Eingabe erwarten
-            '--input-ipc-server=/tmp/mpv-socket',  # IPC für Steuerung
             '--force-window=immediate',   # Fenster sofort erstellen
             '--keep-open=no',             # Nicht auf Eingabe warten am Ende
             '--idle=no',                  # Nicht im Idle-Modus starten
@@ -137,39 +181,147 @@ class StreamPlayer:
             '--stream-lavf-o=reconnect=1,reconnect_streamed=1,reconnect_delay_max=2',
         ]
         
-        # Hardware-Beschleunigung für Raspberry Pi 4
-        # v4l2m2m-copy nutzt den BCM2835 Hardware-Decoder
-        if hw_accel:
-            args.extend([
-                '--hwdec=v4l2m2m-copy',  # BCM2835 Hardware H.264 Decoder
-            ])
-        else:
-            args.extend([
-                '--hwdec=no',
-            ])
-        
+        # Hardware-Beschleunigung: das passende --hwdec wählt _start_mpv
+        # codec-abhängig (siehe _CODEC_HWDEC)
+        self._hw_accel = hw_accel
+
         # Video-Output: GPU mit DRM-Kontext für Hardware-beschleunigte Skalierung
         # Dies reduziert CPU-Last von ~275% auf ~20%!
-        env = os.environ.copy()
         args.extend([
             '--vo=gpu',                     # GPU-basiertes Rendering
             '--gpu-context=drm',            # DRM-Kontext für Konsole (ohne X11)
             '--gpu-api=opengl',             # OpenGL ES auf dem Pi
         ])
-        logger.info("Verwende GPU Video-Output mit DRM-Kontext")
-        
+
+        return args
+
+    def _probe_codec(self, url: str) -> Optional[str]:
+        """Ermittelt den Video-Codec eines Streams per ffprobe (gecacht)"""
+        codec = self._codec_cache.get(url)
+        if codec is not None:
+            return codec
+
+        try:
+            result = subprocess.run(
+                ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+                 '-show_entries', 'stream=codec_name', '-of', 'csv=p=0', url],
+                capture_output=True,
+                text=True,
+                timeout=2
+            )
+            codec = result.stdout.strip() or None
+        except Exception as e:
+            logger.debug(f"Codec-Probe für {url} fehlgeschlagen: {e}")
+
+        # Nur Erfolge cachen - der nächste Versuch darf es erneut probieren
+        if codec:
+            self._codec_cache[url] = codec
+        return codec
+
+    def _start_mpv(self, url: str):
+        """Startet mpv mit optimierten Einstellungen für niedrige Latenz"""
+        # Geänderte Konfiguration (z.B. Hardware-Beschleunigung) übernehmen
+        version = self.config.get_version()
+        if version != self._mpv_args_version:
+            self._mpv_static_args = tuple(self._build_mpv_args())
+            self._mpv_args_version = version
+
+        # IPC für Steuerung und Startup-Erkennung (siehe _wait_for_startup)
+        self._ipc_seq += 1
+        self._ipc_socket = f"/tmp/mpv-{os.getpid()}-{self._ipc_seq}.sock"
+
+        # Decoder passend zum Stream-Codec wählen
+        if self._hw_accel:
+            codec = self._probe_codec(url)
+            hwdec_args = _CODEC_HWDEC.get(codec, _DEFAULT_HWDEC)
+        else:
+            hwdec_args = ('--hwdec=no',)
+
+        args = ['mpv', url, f'--input-ipc-server={self._ipc_socket}',
+                *hwdec_args, *self._mpv_static_args]
+
         logger.debug(f"mpv Befehl: {' '.join(args)}")
-        
+
+        # start_new_session statt preexec_fn: gleiche Prozessgruppen-Semantik,
+        # aber CPython darf den schnellen posix_spawn-Pfad nutzen (kein
+        # vollständiger fork des Python-Heaps pro Stream-Start)
         self._process = subprocess.Popen(
             args,
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL,
-            env=env,
-            preexec_fn=os.setsid
+            env=self._child_env,
+            start_new_session=True
         )
-        
+        self._process_alive = True
+
         logger.info(f"mpv gestartet (PID: {self._process.pid})")
-    
+
+    def _wait_for_startup(self, timeout: float = 1.0) -> bool:
+        """
+        Wartet bis mpv bereit ist (IPC-Socket antwortet) oder der Prozess
+        stirbt. Liefert True wenn mpv läuft - im Normalfall deutlich vor
+        Ablauf des Timeouts, statt immer die volle Wartezeit zu verbrennen
+        """
+        deadline = time.monotonic() + timeout
+
+        while time.monotonic() < deadline:
+            process = self._process
+            if process is None or process.poll() is not None:
+                return False
+
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.settimeout(0.1)
+                    sock.connect(self._ipc_socket)
+                    sock.sendall(b'{"command":["get_property","video-out-params"]}\n')
+                    if sock.recv(1024):
+                        return True
+            except OSError:
+                # Socket noch nicht da - mpv startet noch
+                pass
+
+            time.sleep(0.02)
+
+        # Timeout: mpv antwortet (noch) nicht per IPC, läuft aber - wie
+        # bisher als Erfolg werten solange der Prozess lebt
+        process = self._process
+        return process is not None and process.poll() is None
+
+    def _wait_exit(self, process: subprocess.Popen, timeout: float) -> bool:
+        """
+        Wartet auf das Prozessende. Nutzt wenn möglich pidfd + epoll - der
+        Kernel weckt dann exakt beim Exit, statt dass Popen.wait(timeout)
+        in Schlaf-Intervallen nachpollt. Liefert True wenn beendet
+        """
+        if hasattr(os, 'pidfd_open'):
+            try:
+                pidfd = os.pidfd_open(process.pid)
+            except OSError:
+                # Prozess existiert nicht mehr - nur noch einsammeln
+                process.wait()
+                return True
+
+            try:
+                ep = select.epoll()
+                try:
+                    ep.register(pidfd, select.EPOLLIN)
+                    if not ep.poll(timeout):
+                        return False
+                finally:
+                    ep.close()
+            finally:
+                os.close(pidfd)
+
+            process.wait()
+            return True
+
+        # Fallback für alte Kernel: klassisches Warten mit Timeout
+        try:
+            process.wait(timeout=timeout)
+            return True
+        except subprocess.TimeoutExpired:
+            return False
+
     def _terminate_process(self, process: subprocess.Popen):
         """Beendet einen Prozess sauber und räumt Zombies auf"""
         if process is None:
@@ -179,17 +331,17 @@ class StreamPlayer:
             # Prüfen ob Prozess noch läuft
             if process.poll() is None:
                 try:
-                    # Zuerst SIGTERM
-                    os.killpg(os.getpgid(process.pid), signal.SIGTERM)
-                    
-                    # Warten
-                    try:
-                        process.wait(timeout=2)
-                    except subprocess.TimeoutExpired:
-                        # Dann SIGKILL
+                    # Zuerst SIGTERM direkt an den Prozess - mpv/feh beenden
+                    # sich darauf in Millisekunden, und terminate() spart den
+                    # getpgid-Syscall
+                    process.terminate()
+
+                    # Warten - kurze Frist, der Wechsel wartet hier im Lock
+                    if not self._wait_exit(process, 0.5):
+                        # Dann SIGKILL an die ganze Prozessgruppe
                         os.killpg(os.getpgid(process.pid), signal.SIGKILL)
-                        process.wait(timeout=1)
-                        
+                        self._wait_exit(process, 0.5)
+
                     logger.debug(f"Prozess {process.pid} beendet")
                 except ProcessLookupError:
                     # Prozess existiert nicht mehr
@@ -210,12 +362,14 @@ class StreamPlayer:
         """Startet den Monitor-Thread"""
         self._stop_monitor()
         self._running = True
+        self._monitor_stop.clear()
         self._monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
         self._monitor_thread.start()
-    
+
     def _stop_monitor(self):
         """Stoppt den Monitor-Thread"""
         self._running = False
+        self._monitor_stop.set()
         if self._monitor_thread:
             self._monitor_thread.join(timeout=1)
             self._monitor_thread = None
@@ -225,66 +379,90 @@ class StreamPlayer:
         reconnect_delay = self.config.get('player.reconnect_delay_ms', 2000) / 1000
         max_attempts = self.config.get('player.max_reconnect_attempts', 10)
         attempts = 0
-        
+
         while self._running and self._current_stream:
-            time.sleep(1)
-            
-            if self._process and self._process.poll() is not None:
-                # Prozess ist beendet
-                exit_code = self._process.returncode
-                logger.warning(f"mpv beendet mit Code {exit_code}")
-                
-                if attempts < max_attempts:
-                    attempts += 1
-                    logger.info(f"Reconnect Versuch {attempts}/{max_attempts}")
-                    
-                    self._status = 'reconnecting'
-                    time.sleep(reconnect_delay)
-                    
-                    try:
-                        self._start_mpv(self._current_stream)
-                        # Kurz warten und prüfen ob mpv läuft
-                        time.sleep(1.0)
-                        
-                        if self._process and self._process.poll() is None:
-                            self._status = 'playing'
-                            logger.info("Reconnect erfolgreich - Stream läuft")
-                            # Bei Erfolg Zähler zurücksetzen
-                            attempts = 0
-                        else:
-                            exit_code = self._process.returncode if self._process else -1
-                            logger.warning(f"Reconnect fehlgeschlagen - mpv beendet mit Code {exit_code}")
-                            # Zähler nicht zurücksetzen, weiter versuchen
-                    except Exception as e:
-                        logger.error(f"Reconnect fehlgeschlagen: {e}")
-                else:
-                    logger.error("Maximale Reconnect-Versuche erreicht")
-                    self._status = 'error'
-                    self._show_fallback()
+            process = self._process
+            if process is None:
+                break
+
+            # Blockierend auf das Prozessende warten - der Kernel weckt den
+            # Thread sofort beim Exit, statt einmal pro Sekunde zu pollen
+            try:
+                process.wait()
+            except Exception:
+                pass
+
+            if not self._running or process is not self._process:
+                # stop() oder play() haben den Prozess bereits ersetzt
+                break
+
+            logger.warning(f"mpv beendet mit Code {process.returncode}")
+            self._process_alive = False
+
+            if attempts < max_attempts:
+                attempts += 1
+                logger.info(f"Reconnect Versuch {attempts}/{max_attempts}")
+
+                self._status = 'reconnecting'
+                # Unterbrechbare Wartezeit: stop()/play() beenden den
+                # Monitor sofort statt die volle Delay-Zeit abzuwarten
+                if self._monitor_stop.wait(reconnect_delay):
                     break
+
+                try:
+                    self._start_mpv(self._current_stream)
+                    # Auf IPC-Bereitschaft warten statt fix zu schlafen -
+                    # gleiche Logik wie in play()
+                    if self._wait_for_startup(1.0):
+                        self._status = 'playing'
+                        logger.info("Reconnect erfolgreich - Stream läuft")
+                        # Bei Erfolg Zähler zurücksetzen
+                        attempts = 0
+                    else:
+                        exit_code = self._process.returncode if self._process else -1
+                        logger.warning(f"Reconnect fehlgeschlagen - mpv beendet mit Code {exit_code}")
+                        self._process_alive = False
+                        # Zähler nicht zurücksetzen, weiter versuchen
+                except Exception as e:
+                    logger.error(f"Reconnect fehlgeschlagen: {e}")
             else:
-                # Stream läuft, Zähler zurücksetzen
-                attempts = 0
+                logger.error("Maximale Reconnect-Versuche erreicht")
+                self._status = 'error'
+                self._show_fallback()
+                break
     
     def _show_fallback(self):
         """Zeigt das Fallback-Bild an"""
+        # Läuft die Anzeige noch, reicht sie weiter - ein erneutes
+        # fork+exec pro Fehlversuch wäre unnötig (z.B. wenn jeder
+        # Reconnect-Zyklus hier landet)
+        if self._fallback_process and self._fallback_process.poll() is None:
+            return
+
         fallback_image = self.config.get('streams.fallback_image', '')
-        
-        if fallback_image and Path(fallback_image).exists():
+
+        # stat() nur bei Pfadänderung oder Negativbefund - ein positiver
+        # Befund bleibt gecacht, damit Fehler-Stürme nicht pro Versuch die
+        # SD-Karte treffen. Fehlende Bilder werden erneut geprüft, sie
+        # können nach der Provisionierung auftauchen
+        cached_path, exists = self._fallback_stat
+        if fallback_image != cached_path or not exists:
+            exists = bool(fallback_image) and Path(fallback_image).exists()
+            if fallback_image and not exists and fallback_image != cached_path:
+                logger.warning(f"Fallback-Bild nicht gefunden: {fallback_image}")
+            self._fallback_stat = (fallback_image, exists)
+
+        if exists:
             logger.info(f"Zeige Fallback-Bild: {fallback_image}")
-            
+
             try:
-                env = os.environ.copy()
-                if 'DISPLAY' not in env:
-                    env['DISPLAY'] = ':0'
-                
                 # feh für Bildanzeige
                 self._fallback_process = subprocess.Popen(
                     ['feh', '--fullscreen', '--auto-zoom', '--hide-pointer', fallback_image],
                     stdout=subprocess.DEVNULL,
                     stderr=subprocess.DEVNULL,
-                    env=env,
-                    preexec_fn=os.setsid
+                    env=self._child_env,
+                    start_new_session=True
                 )
             except Exception as e:
                 logger.error(f"Fehler beim Anzeigen des Fallback-Bildes: {e}")
@@ -305,21 +483,17 @@ class StreamPlayer:
     
     def is_playing(self) -> bool:
         """Prüft ob ein Stream läuft"""
-        if self._status != 'playing':
-            return False
-        if self._process is None:
-            return False
-        # Prüfe ob Prozess noch läuft
-        if self._process.poll() is not None:
-            return False
-        return True
-    
+        return self._status == 'playing' and self._process_alive
+
     def get_detailed_status(self) -> dict:
-        """Gibt detaillierten Status zurück"""
-        process_running = self._process is not None and self._process.poll() is None
+        """Gibt detaillierten Status als eine konsistente Momentaufnahme zurück"""
+        # Lokale Referenz: kein Riss wenn _process währenddessen von
+        # play()/stop() ausgetauscht wird. Die Lebend-Info liefert das vom
+        # Monitor gepflegte Flag - kein waitpid pro Status-Abfrage
+        process = self._process
         return {
             'status': self._status,
             'stream': self._current_stream,
-            'process_running': process_running,
-            'pid': self._process.pid if self._process else None
+            'process_running': self._process_alive,
+            'pid': process.pid if process else None
         }
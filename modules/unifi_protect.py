@@ -5,15 +5,35 @@ Basierend auf UniFi Protect API v6.2.88
 """
 
 import json
+import os
 import time
 import threading
 import logging
 import requests
+import urllib3
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import List, Dict, Optional
 from urllib.parse import urljoin, urlparse
 
 logger = logging.getLogger(__name__)
 
+# orjson parst die Kamera-Antworten in C statt im Python-Tokenizer -
+# bei fehlender Installation fällt der Code auf stdlib json zurück
+try:
+    import orjson
+
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+
+    _loads = json.loads
+
 
 class UniFiProtectClient:
     """Client für UniFi Protect API"""
@@ -23,21 +43,58 @@ class UniFiProtectClient:
         self.mqtt_client = mqtt_client
         
         self.url = config_manager.get('unifi_protect.url', '').rstrip('/')
+        # Hostname und RTSPS-Basis einmal ableiten - urlparse pro Kamera und
+        # Refresh wäre wiederholte String-Arbeit für ein konstantes Ergebnis
+        self._host = urlparse(self.url).hostname if self.url else None
+        self._rtsps_base = f"rtsps://{self._host}:7441/"
         self.api_key = config_manager.get('unifi_protect.api_key', '')
         self.username = config_manager.get('unifi_protect.username', '')
         self.password = config_manager.get('unifi_protect.password', '')
         self.verify_ssl = config_manager.get('unifi_protect.verify_ssl', False)
+
+        # Warnungen für selbst-signierte Zertifikate einmalig unterdrücken
+        if not self.verify_ssl:
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
         
         self._session: Optional[requests.Session] = None
         self._token: Optional[str] = None
         self._cookies = {}
         self._connected = False
-        self._cameras: List[Dict] = []
+        # Unveränderliches Tupel, das _fetch_cameras atomar austauscht -
+        # Leser bekommen es ohne Kopie und ohne Riss zu sehen
+        self._cameras: tuple = ()
+        # Parallel gepflegter Index id -> Kamera für O(1) Lookups
+        self._cameras_by_id: Dict[str, Dict] = {}
+        # Kameras, deren RTSPS-Stream seit dem letzten Refresh bereits
+        # nachgeschlagen wurde (siehe get_rtsp_url)
+        self._rtsp_resolved_ids: set = set()
         self._nvr_info: Dict = {}
+        # Digest der zuletzt veröffentlichten Kameraliste - unverändert heißt
+        # kein erneuter Publish auf das retained Topic
+        self._last_cameras_digest = None
         
         self._running = False
+        self._stop_event = threading.Event()
         self._update_thread: Optional[threading.Thread] = None
-        self._update_interval = 60  # Sekunden
+        # Adaptives Abruf-Intervall: verdoppelt sich bei stabiler
+        # Kameraliste bis _max_update_interval, Änderungen setzen zurück
+        self._base_update_interval = 60  # Sekunden
+        self._max_update_interval = 600
+        self._update_interval = self._base_update_interval
+        self._last_cams_hash = None
+        # ETag der letzten /cameras-Antwort für bedingte GETs
+        self._cameras_etag: Optional[str] = None
+        # Kurzlebiger Antwort-Cache url -> (gültig_bis, payload) für die
+        # Hilfs-Endpunkte (NVR-Info, Liveviews, Viewers)
+        self._resp_cache: Dict[str, tuple] = {}
+        # Laufende Snapshot-Abrufe pro Kamera - parallele Aufrufer teilen
+        # sich das Ergebnis statt eigene GETs zu stellen
+        self._snapshot_inflight: Dict[str, Future] = {}
+        self._snapshot_lock = threading.Lock()
+
+        # Zuletzt erfolgreicher Verbindungszustand (Pfad + Auth-Header) -
+        # ein Warmstart spart die komplette Probing-Runde
+        self._state_file = config_manager.config_path.with_name('protect_state.json')
         
         # API Base Path - UniFi Protect Integration API v1
         # Offizieller Pfad laut Dokumentation: /proxy/protect/integration/v1/
@@ -47,6 +104,10 @@ class UniFiProtectClient:
             '/api'
         ]
         self._active_api_path = None
+        # Endpunkt-URLs und Snapshot-Vorlage aus dem Standard-Pfad ableiten -
+        # die Pfad-Ermittlung leitet sie bei Erfolg neu ab, die heißen
+        # Aufrufpfade bauen sie dann nicht mehr pro Aufruf zusammen
+        self._derive_urls('/proxy/protect/api')
     
     def start(self):
         """Startet den UniFi Protect Client"""
@@ -55,12 +116,14 @@ class UniFiProtectClient:
             return
         
         self._running = True
+        self._stop_event.clear()
         self._update_thread = threading.Thread(target=self._update_loop, daemon=True)
         self._update_thread.start()
-    
+
     def stop(self):
         """Stoppt den Client"""
         self._running = False
+        self._stop_event.set()
         if self._update_thread:
             self._update_thread.join(timeout=5)
         self._disconnect()
@@ -68,20 +131,41 @@ class UniFiProtectClient:
     def connect(self) -> bool:
         """Verbindet mit UniFi Protect"""
         try:
-            self._session = requests.Session()
-            self._session.verify = self.verify_ssl
-            
-            # Warnungen für selbst-signierte Zertifikate unterdrücken
-            if not self.verify_ssl:
-                import urllib3
-                urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-            
-            # Standard Headers
-            self._session.headers.update({
-                'Accept': 'application/json',
-                'Content-Type': 'application/json'
-            })
+            # Session über Reconnects hinweg wiederverwenden - so bleiben die
+            # Keep-Alive-Verbindungen im Pool und der TLS-Handshake entfällt
+            if self._session is None:
+                self._session = requests.Session()
+                self._session.verify = self.verify_ssl
+
+                # Connection-Pool mit Retry für transiente Gateway-Fehler.
+                # pool_maxsize deckt parallele Snapshot-Abrufe ab, ohne dass
+                # Verbindungen aus dem Pool verdrängt werden und neue
+                # TLS-Handshakes anfallen
+                adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=32,
+                    max_retries=Retry(
+                        total=3,
+                        backoff_factor=0.3,
+                        status_forcelist=[502, 503, 504]
+                    )
+                )
+                self._session.mount('https://', adapter)
+                self._session.mount('http://', adapter)
+
+                # Standard Headers
+                self._session.headers.update({
+                    'Accept': 'application/json',
+                    'Content-Type': 'application/json'
+                })
             
+            # Warmstart: zuletzt erfolgreichen Pfad/Header zuerst versuchen -
+            # eine einzelne Probe statt der vollen Probing-Runden
+            if self._try_saved_state():
+                self._connected = True
+                logger.info(f"UniFi Protect verbunden (gespeicherter Zustand, Pfad: {self._active_api_path})")
+                return True
+
             # API-Key Authentifizierung (bevorzugt für NVR Pro)
             if self.api_key:
                 # Verschiedene Header-Formate probieren
@@ -91,36 +175,25 @@ class UniFiProtectClient:
                     {'Authorization': f'Bearer {self.api_key}'},
                 ]
                 
-                for headers in auth_headers:
-                    self._session.headers.update(headers)
-                    
-                    # Versuche verschiedene API-Pfade
-                    for api_path in self._api_paths:
-                        try:
-                            # Teste mit Cameras-Endpoint (laut API-Doku)
-                            test_url = f"{self.url}{api_path}/cameras"
-                            logger.debug(f"Teste API-Pfad: {test_url}")
-                            
-                            response = self._session.get(test_url, timeout=10)
-                            
-                            if response.status_code == 200:
-                                self._active_api_path = api_path
-                                self._connected = True
-                                logger.info(f"UniFi Protect verbunden (API-Key, Pfad: {api_path})")
-                                return True
-                            elif response.status_code == 401:
-                                logger.debug(f"API-Pfad {api_path} mit Header {headers}: 401 Unauthorized")
-                            elif response.status_code == 404:
-                                logger.debug(f"API-Pfad {api_path}: nicht gefunden")
-                            else:
-                                logger.debug(f"API-Pfad {api_path}: Status {response.status_code}")
-                        except requests.exceptions.RequestException as e:
-                            logger.debug(f"API-Pfad {api_path} Fehler: {e}")
-                    
-                    # Header zurücksetzen für nächsten Versuch
-                    for key in headers:
-                        self._session.headers.pop(key, None)
-                
+                # Alle (Header x Pfad)-Kombinationen parallel proben - die
+                # erste 200er-Antwort gewinnt. Sequentiell summieren sich
+                # sonst die Timeouts aller Fehlversuche
+                candidates = [(h, p) for h in auth_headers for p in self._api_paths]
+                with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+                    futures = {
+                        executor.submit(self._probe_auth, h, p): (h, p)
+                        for h, p in candidates
+                    }
+                    for future in as_completed(futures):
+                        if future.result():
+                            headers, api_path = futures[future]
+                            self._session.headers.update(headers)
+                            self._set_api_path(api_path)
+                            self._connected = True
+                            self._save_state(headers)
+                            logger.info(f"UniFi Protect verbunden (API-Key, Pfad: {api_path})")
+                            return True
+
                 logger.warning("UniFi Protect: API-Key Authentifizierung fehlgeschlagen bei allen Pfaden")
             
             # Fallback: Username/Password Login (für Cloud Key)
@@ -173,9 +246,12 @@ class UniFiProtectClient:
                     for api_path in self._api_paths:
                         test_url = f"{self.url}{api_path}/cameras"
                         try:
-                            test_resp = self._session.get(test_url, timeout=5)
+                            test_resp = self._session.head(
+                                test_url, timeout=5, allow_redirects=False)
+                            if test_resp.status_code == 405:
+                                test_resp = self._session.get(test_url, timeout=5)
                             if test_resp.status_code == 200:
-                                self._active_api_path = api_path
+                                self._set_api_path(api_path)
                                 break
                         except:
                             pass
@@ -190,6 +266,93 @@ class UniFiProtectClient:
         logger.error("UniFi Protect: Login mit allen Endpoints fehlgeschlagen")
         return False
     
+    def _probe_auth(self, headers: Dict, api_path: str) -> bool:
+        """Prüft eine (Auth-Header, API-Pfad)-Kombination per HEAD-Probe"""
+        test_url = f"{self.url}{api_path}/cameras"
+        logger.debug(f"Teste API-Pfad: {test_url}")
+
+        try:
+            # Header pro Request statt an der Session - die Proben laufen
+            # parallel und dürfen sich nicht gegenseitig überschreiben
+            response = self._session.head(
+                test_url, headers=headers, timeout=10, allow_redirects=False)
+            if response.status_code == 405:
+                # Endpoint ohne HEAD-Support: mit GET bestätigen
+                response = self._session.get(test_url, headers=headers, timeout=10)
+
+            if response.status_code == 200:
+                return True
+            logger.debug(f"API-Pfad {api_path} mit Header {list(headers)}: Status {response.status_code}")
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"API-Pfad {api_path} Fehler: {e}")
+
+        return False
+
+    def _try_saved_state(self) -> bool:
+        """
+        Versucht die Verbindung mit dem zuletzt gespeicherten API-Pfad und
+        Auth-Header - eine einzelne HEAD-Probe statt aller Kombinationen
+        """
+        try:
+            if not self._state_file.exists():
+                return False
+
+            state = json.loads(self._state_file.read_text(encoding='utf-8'))
+            api_path = state.get('api_path')
+            headers = state.get('auth_headers') or {}
+
+            # Nur verwenden wenn Controller-URL und TTL noch passen
+            if (not api_path or state.get('url') != self.url
+                    or state.get('exp', 0) < time.time()):
+                return False
+
+            # Header nur für die Probe mitgeben - erst ein bestätigter
+            # 200er montiert sie an die Session, damit ein Fehlschlag keine
+            # alten Auth-Header im regulären Probing hinterlässt
+            test_url = f"{self.url}{api_path}/cameras"
+            response = self._session.head(
+                test_url, headers=headers, timeout=5, allow_redirects=False)
+            if response.status_code == 405:
+                response = self._session.get(test_url, headers=headers, timeout=5)
+
+            if response.status_code == 200:
+                self._session.headers.update(headers)
+                self._set_api_path(api_path)
+                return True
+        except Exception as e:
+            logger.debug(f"Gespeicherter Protect-Zustand nicht verwendbar: {e}")
+
+        return False
+
+    def _save_state(self, auth_headers: Dict):
+        """Speichert den erprobten Verbindungszustand atomar auf Platte"""
+        state = {
+            'url': self.url,
+            'api_path': self._active_api_path,
+            'auth_headers': auth_headers,
+            'exp': time.time() + 3600
+        }
+        try:
+            tmp_path = self._state_file.with_suffix('.tmp')
+            tmp_path.write_text(json.dumps(state), encoding='utf-8')
+            os.replace(tmp_path, self._state_file)
+        except Exception as e:
+            logger.debug(f"Protect-Zustand nicht gespeichert: {e}")
+
+    def _set_api_path(self, api_path: str):
+        """Setzt den aktiven API-Pfad und leitet die URL-Vorlagen ab"""
+        self._active_api_path = api_path
+        self._derive_urls(api_path)
+
+    def _derive_urls(self, api_path: str):
+        """Baut die festen Endpunkt-URLs für den gegebenen API-Pfad"""
+        base = f"{self.url}{api_path}"
+        self._cameras_base = f"{base}/cameras"
+        self._nvr_url = f"{base}/nvr"
+        self._liveviews_url = f"{base}/liveviews"
+        self._viewers_url = f"{base}/viewers"
+        self._snapshot_tmpl = f"{self._cameras_base}/%s/snapshot"
+
     def _disconnect(self):
         """Trennt die Verbindung"""
         if self._session:
@@ -210,7 +373,7 @@ class UniFiProtectClient:
             try:
                 if not self._connected:
                     self.connect()
-                
+
                 if self._connected:
                     self._fetch_cameras()
                     
@@ -222,11 +385,15 @@ class UniFiProtectClient:
                 logger.error(f"UniFi Protect Update-Fehler: {e}")
                 self._connected = False
             
-            # Warten bis zum nächsten Update
-            for _ in range(self._update_interval):
-                if not self._running:
-                    break
-                time.sleep(1)
+            # Ohne Verbindung zügig neu versuchen - der Backoff gilt nur
+            # für das stabile Polling, nicht für die Reconnect-Kadenz
+            if not self._connected:
+                self._update_interval = self._base_update_interval
+
+            # Warten bis zum nächsten Update - das Event bricht die Wartezeit
+            # beim Stoppen sofort ab statt sekündlich zu pollen
+            if self._stop_event.wait(self._update_interval):
+                break
     
     def _fetch_cameras(self):
         """Holt die Kamera-Liste von UniFi Protect"""
@@ -234,49 +401,81 @@ class UniFiProtectClient:
             return
         
         try:
-            # GET /cameras Endpoint (laut API-Dokumentation)
-            cameras_url = f"{self.url}{self._active_api_path}/cameras"
-            
+            # GET /cameras Endpoint (laut API-Dokumentation) - mit
+            # If-None-Match, damit unveränderter Controller-Zustand als 304
+            # ohne Payload und ohne JSON-Parse beantwortet wird
+            cameras_url = self._cameras_base
+
+            headers = {}
+            if self._cameras_etag:
+                headers['If-None-Match'] = self._cameras_etag
+
             response = self._session.get(
                 cameras_url,
                 cookies=self._cookies,
+                headers=headers,
                 timeout=15
             )
-            
+
+            if response.status_code == 304:
+                # Nichts geändert - Kameraliste bleibt wie sie ist
+                self._update_interval = min(
+                    self._update_interval * 2, self._max_update_interval)
+                return
+
             if response.status_code == 200:
-                cameras = response.json()
-                
-                self._cameras = []
-                for cam in cameras:
-                    if cam.get('state') == 'CONNECTED':
-                        camera_info = {
-                            'id': cam.get('id', ''),
-                            'name': cam.get('name', 'Unbekannt'),
-                            'type': cam.get('modelKey', 'camera'),
-                            'model': cam.get('type', ''),
-                            'state': cam.get('state', ''),
-                            'mac': cam.get('mac', ''),
-                            'rtsp_url': None,  # Wird bei Bedarf abgerufen
-                            'snapshot_url': self._get_snapshot_url(cam.get('id', ''))
-                        }
-                        
-                        # Versuche existierende RTSPS Streams abzurufen
-                        rtsp_url = self._get_existing_rtsps_stream(cam.get('id', ''))
-                        if rtsp_url:
-                            camera_info['rtsp_url'] = rtsp_url
-                        else:
-                            # Generiere Standard RTSP URL aus channels
-                            camera_info['rtsp_url'] = self._get_rtsp_url_from_channels(cam)
-                        
-                        self._cameras.append(camera_info)
-                
+                self._cameras_etag = response.headers.get('ETag')
+                cameras = _loads(response.content)
+
+                connected = [cam for cam in cameras if cam.get('state') == 'CONNECTED']
+
+                # Neue Liste und Index aufbauen und erst am Ende tauschen -
+                # Leser sehen so nie einen halb aktualisierten Zustand
+                new_list = []
+                new_map = {}
+                snapshot_tmpl = self._snapshot_tmpl
+                for cam in connected:
+                    cam_id = cam.get('id', '')
+                    camera_info = {
+                        'id': cam_id,
+                        'name': cam.get('name', 'Unbekannt'),
+                        'type': cam.get('modelKey', 'camera'),
+                        'model': cam.get('type', ''),
+                        'state': cam.get('state', ''),
+                        'mac': cam.get('mac', ''),
+                        # Günstige Standard-URL aus den Channels - ob ein
+                        # existierender RTSPS-Stream sie ersetzt, klärt
+                        # get_rtsp_url erst beim ersten Zugriff (lazy)
+                        'rtsp_url': self._get_rtsp_url_from_channels(cam),
+                        'snapshot_url': snapshot_tmpl % cam_id
+                    }
+
+                    new_list.append(camera_info)
+                    new_map[cam_id] = camera_info
+
+                self._cameras, self._cameras_by_id = tuple(new_list), new_map
+                # Frische Kamera-Dicts -> RTSPS-Auflösung beginnt von vorn
+                self._rtsp_resolved_ids = set()
                 logger.info(f"UniFi Protect: {len(self._cameras)} Kameras gefunden")
+
+                # Intervall anpassen: stabile Installationen müssen den NVR
+                # nicht im Minutentakt abfragen
+                cams_hash = hash(tuple((c['id'], c['state']) for c in new_list))
+                if cams_hash == self._last_cams_hash:
+                    self._update_interval = min(
+                        self._update_interval * 2, self._max_update_interval)
+                else:
+                    self._update_interval = self._base_update_interval
+                    self._last_cams_hash = cams_hash
                 
             elif response.status_code == 401:
                 logger.warning("UniFi Protect: Token abgelaufen, reconnect...")
                 self._connected = False
             else:
-                logger.error(f"UniFi Protect API-Fehler: {response.status_code} - {response.text[:200]}")
+                # Nur die ersten 200 Bytes dekodieren - response.text würde
+                # auch seitengroße HTML-Fehlerantworten komplett dekodieren
+                snippet = response.content[:200].decode('utf-8', 'replace')
+                logger.error(f"UniFi Protect API-Fehler: {response.status_code} - {snippet}")
                 
         except Exception as e:
             logger.error(f"Fehler beim Abrufen der Kameras: {e}")
@@ -288,11 +487,11 @@ class UniFiProtectClient:
         
         try:
             # GET /cameras/{id}/rtsps-stream (laut API-Dokumentation)
-            stream_url = f"{self.url}{self._active_api_path}/cameras/{camera_id}/rtsps-stream"
+            stream_url = f"{self._cameras_base}/{camera_id}/rtsps-stream"
             response = self._session.get(stream_url, timeout=10)
             
             if response.status_code == 200:
-                streams = response.json()
+                streams = _loads(response.content)
                 # Bevorzuge "high" Qualität, dann "medium", dann "low"
                 for quality in ['high', 'medium', 'low']:
                     if streams.get(quality):
@@ -312,7 +511,7 @@ class UniFiProtectClient:
         
         try:
             # POST /cameras/{id}/rtsps-stream (laut API-Dokumentation)
-            stream_url = f"{self.url}{self._active_api_path}/cameras/{camera_id}/rtsps-stream"
+            stream_url = f"{self._cameras_base}/{camera_id}/rtsps-stream"
             
             response = self._session.post(
                 stream_url,
@@ -321,7 +520,7 @@ class UniFiProtectClient:
             )
             
             if response.status_code == 200:
-                streams = response.json()
+                streams = _loads(response.content)
                 logger.info(f"RTSPS Streams erstellt für Kamera {camera_id}: {list(streams.keys())}")
                 return streams
             else:
@@ -334,46 +533,61 @@ class UniFiProtectClient:
     
     def _get_rtsp_url_from_channels(self, camera: Dict) -> str:
         """Generiert die RTSP URL aus den Kamera-Channels"""
-        camera_id = camera.get('id', '')
-        
-        # UniFi Protect RTSPS URL Format
-        channels = camera.get('channels', [])
-        
-        for channel in channels:
-            if channel.get('name') == 'High' or channel.get('id') == 0:
-                rtsp_alias = channel.get('rtspAlias', '')
-                if rtsp_alias:
-                    parsed = urlparse(self.url)
-                    host = parsed.hostname
-                    return f"rtsps://{host}:7441/{rtsp_alias}"
-        
-        # Fallback: Standard URL
-        parsed = urlparse(self.url)
-        host = parsed.hostname
-        return f"rtsps://{host}:7441/{camera_id}"
+        # UniFi Protect RTSPS URL Format: High-Channel bevorzugen,
+        # sonst Fallback auf die Standard-URL mit Kamera-ID
+        channels = camera.get('channels') or ()
+        channel = next((c for c in channels
+                        if c.get('id') == 0 or c.get('name') == 'High'), None)
+        rtsp_alias = channel.get('rtspAlias') if channel else None
+        return self._rtsps_base + (rtsp_alias or camera.get('id', ''))
     
     def _get_snapshot_url(self, camera_id: str) -> str:
         """Generiert die Snapshot URL für eine Kamera"""
-        if self._active_api_path:
-            return f"{self.url}{self._active_api_path}/cameras/{camera_id}/snapshot"
-        return f"{self.url}/proxy/protect/api/cameras/{camera_id}/snapshot"
+        return self._snapshot_tmpl % camera_id
     
     def get_camera_snapshot(self, camera_id: str) -> Optional[bytes]:
         """Holt einen Snapshot von einer Kamera"""
         if not self._session or not self._active_api_path:
             logger.warning(f"Snapshot nicht möglich: session={self._session is not None}, path={self._active_api_path}")
             return None
-        
+
+        # Request-Coalescing: läuft für diese Kamera schon ein Abruf
+        # (z.B. Refresh-Sturm im Kachel-Grid der Web-UI), auf dessen
+        # Ergebnis warten statt einen weiteren GET zu stellen
+        with self._snapshot_lock:
+            inflight = self._snapshot_inflight.get(camera_id)
+            if inflight is None:
+                future = Future()
+                self._snapshot_inflight[camera_id] = future
+
+        if inflight is not None:
+            try:
+                return inflight.result(timeout=20)
+            except Exception:
+                return None
+
+        result = None
+        try:
+            result = self._fetch_snapshot(camera_id)
+        finally:
+            with self._snapshot_lock:
+                self._snapshot_inflight.pop(camera_id, None)
+            future.set_result(result)
+        return result
+
+    def _fetch_snapshot(self, camera_id: str) -> Optional[bytes]:
+        """Führt den eigentlichen Snapshot-Abruf aus"""
         try:
             # GET /cameras/{id}/snapshot (laut API-Dokumentation)
             # Keine zusätzlichen Parameter - UniFi Integration API akzeptiert sie nicht
-            url = f"{self.url}{self._active_api_path}/cameras/{camera_id}/snapshot"
-            
-            response = self._session.get(url, timeout=15)
-            
-            if response.status_code == 200:
-                return response.content
-            else:
+            url = self._snapshot_tmpl % camera_id
+
+            # stream=True + raw.read(): das JPEG landet direkt in einem
+            # bytes-Objekt statt zusätzlich im urllib3-Puffer - halbiert
+            # den Speicher-Peak bei großen 4K-Snapshots
+            with self._session.get(url, timeout=15, stream=True) as response:
+                if response.status_code == 200:
+                    return response.raw.read()
                 logger.warning(f"Snapshot fehlgeschlagen: HTTP {response.status_code}")
                 
         except Exception as e:
@@ -386,89 +600,123 @@ class UniFiProtectClient:
         if not self.mqtt_client:
             return
         
-        cameras_data = []
-        for cam in self._cameras:
-            cameras_data.append({
-                'id': cam['id'],
-                'name': cam['name'],
-                'type': 'unifi',
-                'state': cam['state']
-            })
-        
-        self.mqtt_client.publish('unifi/cameras', {'cameras': cameras_data}, retain=True)
+        cameras_data = [{
+            'id': cam['id'],
+            'name': cam['name'],
+            'type': 'unifi',
+            'state': cam['state']
+        } for cam in self._cameras]
+
+        # Im stabilen Normalfall ändert sich zwischen zwei Refreshes nichts -
+        # dann weder serialisieren noch den Broker behelligen
+        digest = hash(tuple((c['id'], c['name'], c['state']) for c in cameras_data))
+        if digest == self._last_cameras_digest:
+            return
+        self._last_cameras_digest = digest
+
+        # Einmal serialisieren und als bytes durchreichen (publish
+        # überspringt dann das erneute Encoding)
+        self.mqtt_client.publish('unifi/cameras', _dumps({'cameras': cameras_data}), retain=True)
     
-    def get_cameras(self) -> List[Dict]:
-        """Gibt die Liste der Kameras zurück"""
-        return self._cameras.copy()
+    def get_cameras(self) -> tuple:
+        """Gibt die Kameras als unveränderliches Tupel zurück (ohne Kopie)"""
+        return self._cameras
     
     def get_camera_by_id(self, camera_id: str) -> Optional[Dict]:
-        """Findet eine Kamera anhand der ID"""
-        for cam in self._cameras:
-            if cam['id'] == camera_id:
-                return cam
-        return None
+        """Findet eine Kamera anhand der ID (O(1))"""
+        return self._cameras_by_id.get(camera_id)
     
     def get_rtsp_url(self, camera_id: str) -> Optional[str]:
         """Gibt die RTSP URL einer Kamera zurück"""
         camera = self.get_camera_by_id(camera_id)
-        if camera:
-            return camera.get('rtsp_url')
-        return None
+        if camera is None:
+            return None
+
+        # Lazy: der HTTP-Abruf existierender RTSPS-Streams läuft erst beim
+        # ersten Abspielen dieser Kamera - nicht mehr für jede Kamera bei
+        # jedem Refresh. Die Buchführung liegt bewusst außerhalb der
+        # Kamera-Dicts, die get_cameras() unverändert nach außen gibt
+        if camera_id not in self._rtsp_resolved_ids:
+            existing = self._get_existing_rtsps_stream(camera_id)
+            if existing:
+                camera['rtsp_url'] = existing
+            self._rtsp_resolved_ids.add(camera_id)
+
+        return camera.get('rtsp_url')
     
-    def get_nvr_info(self) -> Dict:
-        """Holt NVR Informationen"""
-        if not self._session or not self._active_api_path:
-            return {}
-        
+    def _cached_get(self, url: str, ttl: float, default):
+        """
+        GET mit kurzlebigem Antwort-Cache. Wiederholte Aufrufe innerhalb der
+        TTL treffen den Cache statt den NVR; schlägt der Abruf fehl, wird
+        notfalls der letzte (auch abgelaufene) Wert zurückgegeben
+        """
+        cached = self._resp_cache.get(url)
+        now = time.monotonic()
+        if cached and now < cached[0]:
+            return cached[1]
+
         try:
-            # GET /nvr (laut API-Dokumentation)
-            url = f"{self.url}{self._active_api_path}/nvr"
             response = self._session.get(url, timeout=10)
-            
+
             if response.status_code == 200:
-                self._nvr_info = response.json()
-                return self._nvr_info
-                
+                payload = _loads(response.content)
+                self._resp_cache[url] = (now + ttl, payload)
+                return payload
+
+            logger.error(f"Abruf fehlgeschlagen ({url}): HTTP {response.status_code}")
         except Exception as e:
-            logger.error(f"NVR Info abrufen fehlgeschlagen: {e}")
-        
-        return {}
-    
+            logger.error(f"Abruf fehlgeschlagen ({url}): {e}")
+
+        # Stale-Fallback: lieber veraltete Daten als gar keine
+        if cached:
+            return cached[1]
+        return default
+
+    def get_nvr_info(self) -> Dict:
+        """Holt NVR Informationen"""
+        if not self._session or not self._active_api_path:
+            return {}
+
+        # GET /nvr (laut API-Dokumentation)
+        info = self._cached_get(self._nvr_url, ttl=30, default={})
+        if info:
+            self._nvr_info = info
+        return info
+
     def get_liveviews(self) -> List[Dict]:
         """Holt alle Liveviews"""
         if not self._session or not self._active_api_path:
             return []
-        
-        try:
-            # GET /liveviews (laut API-Dokumentation)
-            url = f"{self.url}{self._active_api_path}/liveviews"
-            response = self._session.get(url, timeout=10)
-            
-            if response.status_code == 200:
-                return response.json()
-                
-        except Exception as e:
-            logger.error(f"Liveviews abrufen fehlgeschlagen: {e}")
-        
-        return []
-    
+
+        # GET /liveviews (laut API-Dokumentation)
+        return self._cached_get(self._liveviews_url, ttl=60, default=[])
+
     def get_viewers(self) -> List[Dict]:
         """Holt alle Viewers (Display-Geräte)"""
         if not self._session or not self._active_api_path:
             return []
-        
-        try:
-            # GET /viewers (laut API-Dokumentation)
-            url = f"{self.url}{self._active_api_path}/viewers"
-            response = self._session.get(url, timeout=10)
-            
-            if response.status_code == 200:
-                return response.json()
-                
-        except Exception as e:
-            logger.error(f"Viewers abrufen fehlgeschlagen: {e}")
-        
-        return []
+
+        # GET /viewers (laut API-Dokumentation)
+        return self._cached_get(self._viewers_url, ttl=15, default=[])
+
+    def refresh_aux(self) -> Dict:
+        """
+        Frischt NVR-Info, Liveviews und Viewers gemeinsam auf. Die drei
+        unabhängigen Abrufe laufen parallel (1x RTT statt 3x) und füllen
+        über die Getter den Antwort-Cache, von dem Folgeaufrufe zehren
+        """
+        if not self._session or not self._active_api_path:
+            return {'nvr': {}, 'liveviews': [], 'viewers': []}
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            f_nvr = executor.submit(self.get_nvr_info)
+            f_liveviews = executor.submit(self.get_liveviews)
+            f_viewers = executor.submit(self.get_viewers)
+            return {
+                'nvr': f_nvr.result(),
+                'liveviews': f_liveviews.result(),
+                'viewers': f_viewers.result()
+            }
     
     def is_connected(self) -> bool:
         """Prüft ob verbunden"""